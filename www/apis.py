@@ -1,13 +1,13 @@
 # -*- coding: utf-8 -*-
 
-import json, logging, inspect, functools
+import json, logging, inspect, functools, base64, binascii
 
 class Page(object):
     '''
     Page object for display pages.
     '''
 
-    def __init__(self, item_count, page_index=1, page_size=10):
+    def __init__(self, item_count, page_index=1, page_size=10, cursor=None):
         '''
         Init Pagination by item_count, page_index and page_size.
         >>> p1 = Page(100, 1)
@@ -31,6 +31,11 @@ class Page(object):
         90
         >>> p3.limit
         10
+        >>> p4 = Page(100, 5, 10, cursor=encode_cursor(1500000000.0, '0015'))
+        >>> p4.after
+        [1500000000.0, '0015']
+        >>> p4.offset
+        0
         '''
         self.item_count = item_count
         self.page_size = page_size
@@ -43,14 +48,46 @@ class Page(object):
             self.page_index = page_index
             self.offset = self.page_size * (page_index - 1)
             self.limit = self.page_size
+        # 带cursor时使用keyset分页：从cursor记录的位置继续取，不再需要offset
+        self.after = decode_cursor(cursor) if cursor else None
+        if self.after is not None:
+            self.offset = 0
         self.has_next = self.page_index < self.page_count
         self.has_previous = self.page_index > 1
+        self.next_cursor = None
+
+    def set_cursor(self, items, field='created_at', key='id'):
+        '''
+        Set next_cursor from the last item of the current page.
+        >>> p = Page(30, 1, 2)
+        >>> p.set_cursor([dict(id='a', created_at=2.0), dict(id='b', created_at=1.0)])
+        >>> decode_cursor(p.next_cursor)
+        [1.0, 'b']
+        '''
+        if self.limit and len(items) == self.limit:
+            last = items[-1]
+            self.next_cursor = encode_cursor(last[field], last[key])
 
     def __str__(self):
         return 'item_count: %s, page_count: %s, page_index: %s, page_size: %s, offset: %s, limit: %s' % (self.item_count, self.page_count, self.page_index, self.page_size, self.offset, self.limit)
 
     __repr__ = __str__
 
+# 分页cursor：把(排序字段值, 主键)编码成不透明的字符串交给客户端，下一页请求时原样传回
+def encode_cursor(value, pk):
+    return base64.urlsafe_b64encode(json.dumps([value, pk]).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (ValueError, TypeError, binascii.Error):
+        raise APIValueError('cursor', 'Invalid cursor.')
+    # 两个值都会作为SQL参数，只接受字符串和数字(bool是int的子类，也不接受)
+    for v in (value, pk):
+        if not isinstance(v, (str, int, float)) or isinstance(v, bool):
+            raise APIValueError('cursor', 'Invalid cursor.')
+    return [value, pk]
+
 class APIError(Exception):
 	def __init__(self, error, data='', message=''):
 		super(APIError, self).__init__(message)
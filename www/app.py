@@ -1,13 +1,50 @@
 # -*- coding: utf-8 -*-
 import logging; logging.basicConfig(level=logging.INFO)
-from jinja2 import Environment, FileSystemLoader
-import asyncio, os, json, time, orm
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+import asyncio, os, time, gzip, random, queue, atexit, orm, encoder, session, assets
+import logging.handlers
 from datetime import datetime
 from aiohttp import web
-from coroweb import get, add_routes, add_static
+from coroweb import get, add_routes, add_static, bypassable, CompiledRouter, make_etag, is_not_modified, strip_etag_encoding
 from test_view import cookie2user, COOKIE_NAME
 from config import configs
+from cache import LRUCache
+from fragment import FragmentCacheExtension
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# 默认的QueueHandler.prepare()在调用logging的线程(也就是事件循环)里执行Formatter。
+# 这里只在参数可能之后被修改(dict、Model等)时先把消息合并成字符串；
+# 参数都是不可变的值时(例如access log)连%格式化也留给QueueListener的线程，时间戳等Formatter工作始终在后台线程
+_IMMUTABLE_ARGS = (str, int, float, bool, type(None))
+
+class QueueHandler(logging.handlers.QueueHandler):
+
+    def prepare(self, record):
+        if record.args and not (isinstance(record.args, tuple) and all(isinstance(a, _IMMUTABLE_ARGS) for a in record.args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+# 日志写到队列后立即返回，由QueueListener的后台线程格式化并写入stream，事件循环不会阻塞在日志I/O上
+def init_logging(level='INFO', format='%(asctime)s %(levelname)s %(name)s %(message)s', **kw):
+    q = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(format))
+    listener = logging.handlers.QueueListener(q, handler)
+    root = logging.getLogger()
+    for h in root.handlers[:]:
+        root.removeHandler(h)
+    root.addHandler(QueueHandler(q))
+    root.setLevel(level)
+    listener.start()
+    # 退出时把队列中剩余的日志写完
+    atexit.register(listener.stop)
+    return listener
 
 def init_jinja2(app, **kw):
     logging.info('init jinja2...')
@@ -21,10 +58,16 @@ def init_jinja2(app, **kw):
         #变量开始、结束的标志
         variable_start_string = kw.get('variable_start_string','{{'),
         variable_end_string=kw.get('variable_end_string', '}}'),
-        # 自动加载修改后的模板文件
-        auto_reload = kw.get('auto_reload',True)
-
+        # 自动加载修改后的模板文件，每次get_template()都要检查文件是否修改过，生产环境应关闭
+        auto_reload = kw.get('auto_reload',True),
+        # 内存中最多缓存的已编译模板个数
+        cache_size = kw.get('cache_size', 400)
     )
+    # 编译后的字节码缓存目录：进程重启时直接加载，不用重新编译__base__.html和各个页面
+    bytecode_cache = kw.get('bytecode_cache', None)
+    if bytecode_cache:
+        os.makedirs(bytecode_cache, exist_ok=True)
+        options['bytecode_cache'] = FileSystemBytecodeCache(bytecode_cache)
     #获取模板文件夹的路径
     path = kw.get('path', None)
     if not path:
@@ -32,7 +75,9 @@ def init_jinja2(app, **kw):
 
     # Environment类是jinja2的核心类，用来保存配置、全局对象以及模板文件的路径
     # FileSystemLoader类加载path路径中的模板文件
-    env = Environment(loader = FileSystemLoader(path), **options)
+    # FragmentCacheExtension提供{% cache key, ttl %}...{% endcache %}片段缓存
+    env = Environment(loader = FileSystemLoader(path), extensions = [FragmentCacheExtension], **options)
+    env.fragment_cache = LRUCache(kw.get('fragment_cache_size', 1000))
     #过滤器集合
     filters = kw.get('filters', None)
 
@@ -40,10 +85,22 @@ def init_jinja2(app, **kw):
         for name, f in filters.items():
             #filters是Environment类的属性：过滤器字典
             env.filters[name] = f
+    # 模板中用static_url('js/awesome.js')生成带hash指纹的静态文件URL
+    env.globals['static_url'] = kw.get('static_url', None) or assets.static_url_for(assets.load_manifest())
+    # 启动时预先加载全部模板，第一个请求不用再等待编译
+    if kw.get('warmup', False):
+        warmup_templates(env)
     # 所有的一切是为了给app添加__templating__字段
     # 前面将jinja2的环境配置都赋值给env了，这里再把env存入app的dict中，这样app就知道要到哪儿去找模板，怎么解析模板。
     app['__template__'] = env # app是一个dict-like对象
 
+def warmup_templates(env):
+    start = time.time()
+    names = env.list_templates()
+    for name in names:
+        env.get_template(name)
+    logging.info('warmed up %s templates in %.3fs' % (len(names), time.time() - start))
+
 #过滤器，返回和当前的时间差
 def datetime_filter(t):
     delta = int(time.time() - t)
@@ -59,42 +116,321 @@ def datetime_filter(t):
     return u'%s年%s月%s日' % (dt.year, dt.month, dt.day)
 
 
-async def auth_factory(app, handler):
-    async def auth(request):
-        logging.info('check user: %s %s' % (request.method, request.path))
-        request.__user__ = None
-        cookie_str = request.cookies.get(COOKIE_NAME)
-        if cookie_str:
-            user = await cookie2user(cookie_str)
-            if user:
-                logging.info('set current user: %s' % user.email)
-                request.__user__ = user
-        if request.path.startswith('/manage/') and (request.__user__ is None or not request.__user__.admin):
-            return web.HTTPFound('/signin')
+# 登录状态的缓存：cookie => User，无效的cookie缓存为False(负缓存)，避免每个请求都校验sha1并查询users表
+# cache_ttl要小于cookie的有效期，用户退出或修改密码后最多cache_ttl秒内旧cookie仍然有效，可调用invalidate_session立即失效
+_sessions = LRUCache(configs.session.cache_size, configs.session.cache_ttl)
+
+def _session_ttl(cookie_str):
+    # cookie格式：id-expires-sha1，缓存时间不能超过cookie本身的过期时间
+    try:
+        expires = int(cookie_str.split('-')[1])
+    except (IndexError, ValueError):
+        return configs.session.cache_ttl
+    return min(configs.session.cache_ttl, expires - time.time())
+
+async def find_session_user(cookie_str):
+    user = _sessions.get(cookie_str)
+    if user is None:
+        user = await cookie2user(cookie_str)
+        if user:
+            ttl = _session_ttl(cookie_str)
+            if ttl > 0:
+                _sessions.set(cookie_str, user.__class__(**user), ttl)
+        else:
+            _sessions.set(cookie_str, False, configs.session.negative_ttl)
+    if not user:
+        return None
+    # 每个请求得到一个新的User对象，视图修改它不会影响缓存；
+    # 放进本次请求的identity map，视图里User.find(request.__user__.id)直接返回它
+    return user.__class__(**user).attach()
+
+def invalidate_session(cookie_str):
+    _sessions.pop(cookie_str)
+
+@bypassable('auth')
+async def auth_factory(request, handler):
+    request.__user__ = None
+    # 用@get(path, auth=False)声明不需要当前用户的视图，不解析cookie(静态文件由add_static声明跳过auth_factory)
+    # /manage/下的视图总是要检查管理员权限，auth=False对它们无效
+    if not getattr(request.match_info.handler, '_auth', True) and not request.path.startswith('/manage/'):
         return (await handler(request))
-    return auth
-
-
-async def data_factory(app, handler):
-    async def parse_data(request):
-        if request.method == 'POST':
-            if request.content_type.startswith('application/json'):
-                request.__data__ = await request.json()
-                logging.info('request json: %s' % str(request.__data__))
-            elif request.content_type.startswith('application/x-www-form-urlencoded'):
-                request.__data__ = await request.post()
-                logging.info('request form: %s' % str(request.__data__))
+    logging.debug('check user: %s %s', request.method, request.path)
+    cookie_str = request.cookies.get(COOKIE_NAME)
+    if cookie_str:
+        # 签名token自带用户信息，校验签名即可，不需要查询数据库
+        if session.is_token(cookie_str):
+            user = session.token2user(cookie_str)
+        else:
+            user = await find_session_user(cookie_str)
+        if user:
+            logging.debug('set current user: %s', user.id)
+            request.__user__ = user
+    if request.path.startswith('/manage/') and (request.__user__ is None or not request.__user__.admin):
+        return web.HTTPFound('/signin')
+    return (await handler(request))
+
+
+@bypassable('data')
+async def data_factory(request, handler):
+    if request.method == 'POST':
+        if request.content_type.startswith('application/json'):
+            request.__data__ = await request.json()
+            logging.debug('request json: %s', request.__data__)
+        elif request.content_type.startswith('application/x-www-form-urlencoded'):
+            request.__data__ = await request.post()
+            logging.debug('request form: %s', request.__data__)
+    return (await handler(request))
+
+# 每个请求一个identity map，请求内按主键重复查询同一行(如auth_factory中cookie2user查过的User)时不再访问数据库
+@bypassable('identity')
+async def identity_factory(request, handler):
+    with orm.identity_map():
         return (await handler(request))
 
-    return parse_data
+# 动态内容的压缩：文本类型、长度不小于min_size的响应按客户端的Accept-Encoding用br或gzip压缩
+# 静态文件不经过这里，由assets.py预先压缩好。compress_factory在cache_factory里面，缓存的是压缩后的内容，
+# 命中缓存时不用再压缩一次
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml')
+
+def accepted_encodings(request):
+    encodings = set()
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        parts = item.strip().split(';')
+        if len(parts) > 1 and parts[1].strip() in ('q=0', 'q=0.0'):
+            continue
+        encodings.add(parts[0].strip().lower())
+    return encodings
+
+def negotiate_encoding(request):
+    ' return the encoding compress_factory uses for this request: br, gzip or None. '
+    accepted = accepted_encodings(request)
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+def add_vary(r, header):
+    vary = r.headers.get('Vary')
+    if not vary:
+        r.headers['Vary'] = header
+    elif header.lower() not in [v.strip().lower() for v in vary.split(',')]:
+        r.headers['Vary'] = '%s, %s' % (vary, header)
+
+def with_encoding(etag, encoding):
+    # 不同编码的内容不同，ETag也要不同
+    return '%s-%s"' % (etag[:-1], encoding) if encoding and etag.endswith('"') else etag
+
+@bypassable('compress')
+async def compress_factory(request, handler):
+    conf = configs.compression
+    r = await handler(request)
+    if not isinstance(r, web.Response) or not isinstance(r.body, bytes) or len(r.body) < conf.min_size \
+            or 'Content-Encoding' in r.headers or not r.content_type.startswith(COMPRESSIBLE_TYPES):
+        return r
+    add_vary(r, 'Accept-Encoding')
+    encoding = negotiate_encoding(request)
+    if encoding == 'br':
+        r.body = brotli.compress(r.body, quality=conf.br_quality)
+    elif encoding == 'gzip':
+        # mtime=0：同样的内容压缩结果相同，ETag(压缩后body的hash)不会因为重新渲染而改变
+        r.body = gzip.compress(r.body, conf.level, mtime=0)
+    else:
+        return r
+    r.headers['Content-Encoding'] = encoding
+    etag = r.headers.get('ETag')
+    if etag:
+        r.headers['ETag'] = with_encoding(etag, encoding)
+    return r
+
+# 给GET请求的200响应加上ETag(视图调用过check_modified时用数据版本，否则用body的hash)，
+# 客户端带着相同的If-None-Match再次请求时返回没有body的304
+@bypassable('etag')
+async def etag_factory(request, handler):
+    r = await handler(request)
+    if request.method not in ('GET', 'HEAD') or not isinstance(r, web.Response) or r.status != 200 \
+            or not isinstance(r.body, bytes):
+        return r
+    etag = r.headers.get('ETag')
+    if etag is None:
+        etag = request.get('__etag__') or make_etag(r.body)
+        # compress_factory在里层，这里看到的可能已经是压缩后的响应
+        r.headers['ETag'] = with_encoding(etag, r.headers.get('Content-Encoding'))
+    else:
+        etag = strip_etag_encoding(etag)
+    last_modified = request.get('__last_modified__')
+    if last_modified is not None and 'Last-Modified' not in r.headers:
+        r.last_modified = int(last_modified)
+    if is_not_modified(request, etag, last_modified):
+        headers = {'ETag': r.headers['ETag']}
+        if 'Last-Modified' in r.headers:
+            headers['Last-Modified'] = r.headers['Last-Modified']
+        return web.Response(status=304, headers=headers)
+    return r
+
+# GET页面的响应缓存：(path+query, 压缩编码) => (body, headers, status, 过期时间, ETag, Last-Modified)
+# ETag在缓存时确定(视图调用过check_modified时用数据版本，否则用body的hash)，命中时交给etag_factory使用，不再重新计算
+# 只缓存匿名用户(request.__user__为None)的200响应，登录用户的页面里有个人信息，不能共用
+_responses = LRUCache(configs.response_cache.maxsize)
+# 正在渲染的页面：path+query => Future。同一个页面同时有很多请求未命中时，只有第一个请求渲染，其余等待结果
+_rendering = {}
+
+def _cache_entry(request, r, ttl):
+    if not isinstance(r, web.Response) or r.status != 200 or not isinstance(r.body, bytes) or 'Set-Cookie' in r.headers:
+        return None
+    headers = r.headers.copy()
+    headers.popall('Content-Length', None)
+    headers.popall('Date', None)
+    etag = request.get('__etag__') or make_etag(r.body)
+    return (r.body, headers, r.status, time.monotonic() + ttl, etag, request.get('__last_modified__'))
+
+def _cached_response(request, entry):
+    body, headers, status, expires, etag, last_modified = entry
+    request['__etag__'] = etag
+    request['__last_modified__'] = last_modified
+    return web.Response(body=body, status=status, headers=headers)
+
+async def _render(key, handler, request, ttl):
+    fut = _rendering[key] = asyncio.get_event_loop().create_future()
+    entry = None
+    try:
+        r = await handler(request)
+        entry = _cache_entry(request, r, ttl)
+        if entry is not None:
+            _responses.set(key, entry, ttl + configs.response_cache.stale)
+        return r
+    finally:
+        del _rendering[key]
+        fut.set_result(entry)
+
+def _unconditional(request):
+    # 后台重新渲染用的请求：去掉客户端的If-None-Match/If-Modified-Since，
+    # 否则调用check_modified的视图会抛出304，缓存永远刷新不了
+    headers = request.headers.copy()
+    headers.popall('If-None-Match', None)
+    headers.popall('If-Modified-Since', None)
+    clone = request.clone(headers=headers)
+    clone.__user__ = request.__user__
+    return clone
+
+async def _revalidate(key, handler, request, ttl):
+    try:
+        await _render(key, handler, request, ttl)
+    except Exception as e:
+        logging.warning('failed to refresh cached response %s: %s' % (key, e))
+
+@bypassable('cache')
+async def cache_factory(request, handler):
+    ttl = getattr(request.match_info.handler, '_cache_ttl', None)
+    if not ttl or request.method != 'GET' or request.__user__ is not None:
+        return (await handler(request))
+    # 缓存的是compress_factory压缩后的内容，每种编码各存一份
+    key = (request.path_qs, negotiate_encoding(request))
+    entry = _responses.get(key)
+    if entry is not None:
+        # 已过期但仍在stale期内：直接返回旧内容，后台重新渲染一次
+        if entry[3] < time.monotonic() and key not in _rendering:
+            asyncio.ensure_future(_revalidate(key, handler, _unconditional(request), ttl))
+        return _cached_response(request, entry)
+    fut = _rendering.get(key)
+    if fut is not None:
+        entry = await asyncio.shield(fut)
+        if entry is not None:
+            return _cached_response(request, entry)
+        # 第一个请求的结果不能缓存(出错、重定向等)，自己处理
+        return (await handler(request))
+    return (await _render(key, handler, request, ttl))
 
 # 编写用于输出日志的middlware
 # handler是视图函数
-async def logger_factory(app, handler):
-    async def logger(request):
-        logging.info('Request: %s %s' % (request.method, request.path))
-        return await handler(request)
-    return logger
+# access log：每个请求一行，记录method、path、status、耗时、数据库耗时和SQL条数
+access_log = logging.getLogger('access')
+
+@bypassable('logger')
+async def logger_factory(request, handler):
+    sample = configs.log.sample
+    start = time.perf_counter()
+    stats = orm.track_queries()
+    status = 500
+    try:
+        r = await handler(request)
+        status = getattr(r, 'status', 200)
+        return r
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        # 按sample比例抽样记录，出错的请求总是记录
+        if status >= 500 or sample >= 1 or random.random() < sample:
+            access_log.info('method=%s path=%s status=%s latency_ms=%.1f db_ms=%.1f queries=%d',
+                request.method, request.path, status, (time.perf_counter() - start) * 1000, stats[1] * 1000, stats[0])
+
+# 流式输出：把内容攒到size字节再写给客户端，避免每个小片段都调用一次write
+class ChunkWriter(object):
+
+    def __init__(self, resp, size=16384):
+        self._resp = resp
+        self._size = size
+        self._chunks = []
+        self._length = 0
+
+    async def write(self, data):
+        self._chunks.append(data)
+        self._length += len(data)
+        if self._length >= self._size:
+            await self.flush()
+
+    async def flush(self):
+        if self._chunks:
+            await self._resp.write(b''.join(self._chunks))
+            self._chunks = []
+            self._length = 0
+
+def is_stream(obj):
+    return hasattr(obj, '__aiter__')
+
+def has_stream(r):
+    return any(is_stream(v) for v in r.values())
+
+# 按JSON格式输出obj：async iterator(例如Model.iterAll)输出成数组，边读取边发送
+async def write_json(w, obj):
+    if is_stream(obj):
+        await w.write(b'[')
+        first = True
+        async for item in obj:
+            await w.write(encoder.dumps(item) if first else b',' + encoder.dumps(item))
+            first = False
+        await w.write(b']')
+    elif isinstance(obj, dict) and has_stream(obj):
+        await w.write(b'{')
+        for i, (k, v) in enumerate(obj.items()):
+            await w.write((b',' if i else b'') + encoder.dumps(str(k)) + b':')
+            await write_json(w, v)
+        await w.write(b'}')
+    else:
+        await w.write(encoder.dumps(obj))
+
+async def stream_json(request, r):
+    resp = web.StreamResponse()
+    resp.content_type = 'application/json;charset=utf-8'
+    await resp.prepare(request)
+    w = ChunkWriter(resp)
+    await write_json(w, r)
+    await w.flush()
+    await resp.write_eof()
+    return resp
+
+# 模板的流式渲染：Template.generate()每渲染出一段就写出去，不用等整个页面渲染完
+async def stream_template(request, template, r):
+    resp = web.StreamResponse()
+    resp.content_type = 'text/html;charset=utf-8'
+    await resp.prepare(request)
+    w = ChunkWriter(resp)
+    for s in template.generate(**r):
+        await w.write(s.encode('utf-8'))
+    await w.flush()
+    await resp.write_eof()
+    return resp
 
 # 处理视图函数返回值，制作response的middleware
 # 请求对象request的处理工序：
@@ -103,57 +439,62 @@ async def logger_factory(app, handler):
 # 1、由视图函数处理request后返回数据
 # 2、@get@post装饰器在返回对象上附加'__method__'和'__route__'属性，使其附带URL信息
 # 3、response_factory对处理后的对象，经过一系列类型判断，构造出真正的web.Response对象
-async def response_factory(app, handler):
-    async def response(request):
-        logging.info('Response handler...')
-        r= await handler(request)
-        logging.info('response result = %s' % str(r))
-        if isinstance(r, web.StreamResponse):   # StreamResponse是所有Response对象的父类
-            return r    # 无需构造，直接返回
-        if isinstance(r,bytes):
-            logging.info('*'*10)
-            resp = web.Response(body=r) # 继承自StreamResponse，接受body参数，构造HTTP响应内容
-            # Response的content_type属性
-            resp.content_type='application/octet-stream'
-            return resp
-        if isinstance(r,str):
-            if r.startswith('redict:'): #若返回重定向字符串
-                return web.HTTPFound(r[9:]) #重定向至目标URL
-            resp = web.Response(body =r.encode('utf-8'))
-            resp.content_type='text/html;charset=utf-8' #utf-8的text格式
+@bypassable('response')
+async def response_factory(request, handler):
+    r= await handler(request)
+    # 参数延迟格式化：没有开启debug日志时不会把整个结果dict转成字符串
+    logging.debug('response result = %s', r)
+    if isinstance(r, web.StreamResponse):   # StreamResponse是所有Response对象的父类
+        return r    # 无需构造，直接返回
+    # 返回async iterator时(例如Blog.iterAll())，以JSON数组流式输出
+    if is_stream(r):
+        return (await stream_json(request, r))
+    if isinstance(r,bytes):
+        resp = web.Response(body=r) # 继承自StreamResponse，接受body参数，构造HTTP响应内容
+        # Response的content_type属性
+        resp.content_type='application/octet-stream'
+        return resp
+    if isinstance(r,str):
+        if r.startswith('redict:'): #若返回重定向字符串
+            return web.HTTPFound(r[9:]) #重定向至目标URL
+        resp = web.Response(body =r.encode('utf-8'))
+        resp.content_type='text/html;charset=utf-8' #utf-8的text格式
+        return resp
+    # r为dict对象时
+    if isinstance(r, dict):
+        # 在后续构造视图函数返回值时，会加入__template__值，用以选择渲染的模板
+        template = r.get('__template__',None)
+        if template is None: # 不带模板信息，返回json对象
+            # 其中有async iterator的值，例如dict(page=p, blogs=Blog.iterAll(...))，流式输出
+            if has_stream(r):
+                return (await stream_json(request, r))
+            # encoder.dumps直接返回utf-8编码的bytes，装了orjson时使用orjson
+            # Model继承自dict可以直接序列化，Page、APIError由encoder.default转换
+            resp = web.Response(body=encoder.dumps(r))
+            resp.content_type = 'application/json;charset=utf-8'
             return resp
-        # r为dict对象时
-        if isinstance(r, dict):
-            # 在后续构造视图函数返回值时，会加入__template__值，用以选择渲染的模板
-            template = r.get('__template__',None)
-            if template is None: # 不带模板信息，返回json对象
-                resp = web.Response(body=json.dumps(r, ensure_ascii=False,
-                                                   default = lambda obj: obj.__dict__).encode('utf8'))
-                # ensure_ascii：默认True，仅能输出ascii格式数据。故设置为False
-                # default：r对象会先被传入default中的函数进行处理，然后才被序列化为json对象
-                # __dict__：以dict形式返回对象属性和值的映射
-                resp.content_type = 'application/json;charset=utf-8'
-                return resp
-            else: #带模板信息，渲染模板
-                # app['__template__']获取已初始化的Environment对象，调用get_template()方法返回Template对象
-                # 调用Template对象的render()方法，传入r渲染模板，返回unicode格式字符串，将其用utf-8编码
-                r['__user__'] = request.__user__
-                resp = web.Response(body=app['__template__'].get_template(template).render(**r).encode('utf-8'))
-                resp.content_type = 'text/html;charset = utf-8'
-                return resp
-        # 返回响应码
-        if isinstance(r, int) and (600 > r >= 100):
-            resp = web.Response(status=r)
+        else: #带模板信息，渲染模板
+            # request.app['__template__']获取已初始化的Environment对象，调用get_template()方法返回Template对象
+            # 调用Template对象的render()方法，传入r渲染模板，返回unicode格式字符串，将其用utf-8编码
+            r['__user__'] = request.__user__
+            # 带__stream__=True时用Template.generate()边渲染边输出，适合很长的列表页
+            if r.get('__stream__'):
+                return (await stream_template(request, request.app['__template__'].get_template(template), r))
+            resp = web.Response(body=request.app['__template__'].get_template(template).render(**r).encode('utf-8'))
+            resp.content_type = 'text/html;charset = utf-8'
             return resp
-        # 返回了一组响应代码和原因，如：(200, 'OK'), (404, 'Not Found')
-        if isinstance(r, tuple) and len(r) == 2:
-            status_code, message =r
-            if isinstance(status_code, int) and (600 > status_code >= 100):
-                return web.Response(status = r, text=str(message))
-        resp = web.Response(body=str(r).encode('utf-8'))  # 以上条件均不满足,默认返回
-        resp.content_type = 'text/plain;charset = utf-8'
+    # 返回响应码
+    if isinstance(r, int) and (600 > r >= 100):
+        resp = web.Response(status=r)
         return resp
-    return response
+    # 返回了一组响应代码和原因，如：(200, 'OK'), (404, 'Not Found')
+    if isinstance(r, tuple) and len(r) == 2:
+        status_code, message =r
+        if isinstance(status_code, int) and (600 > status_code >= 100):
+            return web.Response(status = r, text=str(message))
+    resp = web.Response(body=str(r).encode('utf-8'))  # 以上条件均不满足,默认返回
+    resp.content_type = 'text/plain;charset = utf-8'
+    return resp
 
 '''
 功能性测试代码
@@ -162,12 +503,16 @@ async def response_factory(app, handler):
 
 if __name__ == '__main__':
 	async def init(loop):
+		init_logging(**configs.log)
 		await orm.create_pool(loop=loop, **configs.db)
-		app = web.Application(loop=loop, middlewares=[logger_factory, auth_factory, response_factory])
-		init_jinja2(app, filters=dict(datetime= datetime_filter))
+		app = web.Application(loop=loop, router=CompiledRouter(), middlewares=[logger_factory, identity_factory, auth_factory, etag_factory, cache_factory, compress_factory, response_factory])
+		manifest = assets.load_manifest()
+		init_jinja2(app, filters=dict(datetime= datetime_filter), static_url=assets.static_url_for(manifest), **configs.templates)
 		add_routes(app,'test_view')
-		add_static(app)
-		srv = await loop.create_server(app.make_handler(),'127.0.0.1',9000)
+		add_routes(app,'metrics')
+		add_static(app, max_age=configs.static.max_age, manifest=manifest)
+		# logger_factory已经记录access log，关闭aiohttp自带的access log
+		srv = await loop.create_server(app.make_handler(access_log=None),'127.0.0.1',9000)
 		logging.info('server started at http://127.0.0.1:9000...')
 		return srv
 
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+'''
+Build step for static assets:
+
+* write precompressed .gz (and .br when the brotli module is installed) siblings for
+  every compressible file under static/. aiohttp's static file handler serves the
+  .br/.gz sibling directly when the client accepts that encoding, so no CPU is spent
+  compressing static files per request.
+* hash every file under static/ into static/manifest.json. Templates link assets with
+  static_url('js/awesome.js') => /static/js/awesome.js?v=<hash>, and those fingerprinted
+  URLs are served as immutable, so browsers never revalidate them.
+
+    $ cd www && python assets.py
+'''
+
+import os, sys, gzip, json, hashlib, logging
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+MANIFEST = 'manifest.json'
+
+# 图片和woff字体本身已经压缩过，再压缩没有意义
+COMPRESSIBLE = ('.css', '.js', '.html', '.json', '.svg', '.txt', '.otf', '.ttf', '.eot')
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def compress_static(path=STATIC_PATH, level=9):
+    ' write .gz/.br files next to compressible static files, skipping ones that are up to date. '
+    n = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            src = os.path.join(root, name)
+            mtime = os.path.getmtime(src)
+            data = None
+            for ext, compress in (('.gz', lambda d: gzip.compress(d, level)),
+                                  ('.br', lambda d: brotli.compress(d, quality=11) if brotli else None)):
+                dst = src + ext
+                if os.path.exists(dst) and os.path.getmtime(dst) >= mtime:
+                    continue
+                if data is None:
+                    with open(src, 'rb') as f:
+                        data = f.read()
+                compressed = compress(data)
+                # 压缩后没有变小的文件不生成，直接返回原文件
+                if compressed is None or len(compressed) >= len(data):
+                    continue
+                _write(dst, compressed)
+                n = n + 1
+    logging.info('wrote %s compressed static files under %s' % (n, path))
+    return n
+
+def _hash(path):
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            h.update(block)
+    return h.hexdigest()[:12]
+
+def build_manifest(path=STATIC_PATH, write=True):
+    ' hash every static file, return {relative path: hash} and optionally write it to manifest.json. '
+    manifest = {}
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            # .gz/.br是原文件的压缩副本，共用原文件的hash
+            if name.endswith(('.gz', '.br')) or (root == path and name == MANIFEST):
+                continue
+            src = os.path.join(root, name)
+            manifest[os.path.relpath(src, path).replace(os.sep, '/')] = _hash(src)
+    if write:
+        with open(os.path.join(path, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+    logging.info('hashed %s static files under %s' % (len(manifest), path))
+    return manifest
+
+def load_manifest(path=STATIC_PATH):
+    ' read manifest.json written by the build step, or hash the files now if it does not exist. '
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return build_manifest(path, write=False)
+
+def static_url_for(manifest, prefix='/static/'):
+    ' return the static_url(name) function exposed to templates. '
+    def static_url(name):
+        name = name.lstrip('/')
+        version = manifest.get(name)
+        # 不在manifest中的文件(例如部署后新增的)退回普通URL，按max_age缓存
+        if version is None:
+            return prefix + name
+        return '%s%s?v=%s' % (prefix, name, version)
+    return static_url
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    path = sys.argv[1] if len(sys.argv) > 1 else STATIC_PATH
+    compress_static(path)
+    build_manifest(path)
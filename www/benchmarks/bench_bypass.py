@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+'''
+测量middleware层本身的开销(requests/s)：视图直接返回一个现成的Response，不经过网络。
+比较没有middleware、7个old-style工厂函数、7个@bypassable middleware，以及用skip_middlewares()跳过它们。
+静态文件的处理(在线程池里stat文件)比middleware慢得多，放在这里测量会被噪声淹没。
+    $ cd www && python benchmarks/bench_bypass.py 100000
+'''
+
+import os, sys, time, asyncio, warnings
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from coroweb import bypassable, skip_middlewares, STATIC_BYPASS
+
+RESPONSE = web.Response(text='pong')
+
+async def ping(request):
+    return RESPONSE
+
+def passthrough(name):
+    @bypassable(name)
+    async def middleware(request, handler):
+        return (await handler(request))
+    return middleware
+
+def old_style(name):
+    async def factory(app, handler):
+        async def middleware(request):
+            return (await handler(request))
+        return middleware
+    return factory
+
+NAMES = STATIC_BYPASS[:7]
+
+def make_app(middlewares, skip=None):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        app = web.Application(middlewares=middlewares)
+    route = app.router.add_get('/ping', ping)
+    if skip:
+        skip_middlewares(route.resource, skip)
+    app.freeze()
+    return app
+
+async def bench(n):
+    for name, app in (('raw', make_app([])),
+                      ('old-style', make_app([old_style(name) for name in NAMES])),
+                      ('middlewares', make_app([passthrough(name) for name in NAMES])),
+                      ('bypass', make_app([passthrough(name) for name in NAMES], STATIC_BYPASS))):
+        request = make_mocked_request('GET', '/ping', app=app)
+        start = time.perf_counter()
+        for i in range(n):
+            await app._handle(request)
+        t = time.perf_counter() - start
+        print('%-12s %10.0f requests/s' % (name, n / t))
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    asyncio.run(bench(n))
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+'''
+测量视图函数经过RequestHandler.__call__分发的速度(requests/s)，不经过网络和中间件：
+    $ cd www && python benchmarks/bench_dispatch.py 100000
+'''
+
+import os, sys, time, asyncio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp.test_utils import make_mocked_request
+from coroweb import get, RequestHandler
+
+@get('/api/blogs')
+async def api_blogs(*, page='1'):
+    return page
+
+@get('/blog/{id}')
+async def get_blog(id):
+    return id
+
+@get('/api/comments')
+async def api_comments(*, page='1', size='10', request):
+    return page
+
+CASES = [
+    (api_blogs, '/api/blogs?page=2', {}),
+    (get_blog, '/blog/0015', {'id': '0015'}),
+    (api_comments, '/api/comments?page=3&size=20&other=x', {}),
+]
+
+async def bench(n):
+    for fn, path, match_info in CASES:
+        handler = RequestHandler(None, fn)
+        request = make_mocked_request('GET', path, match_info=match_info)
+        start = time.perf_counter()
+        for i in range(n):
+            await handler(request)
+        t = time.perf_counter() - start
+        print('%-16s %10.0f requests/s' % (fn.__name__, n / t))
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    asyncio.run(bench(n))
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+'''
+序列化1000篇博客的列表(与/api/blogs的返回值相同)，比较原来的json.dumps写法与encoder.dumps：
+    $ cd www && python benchmarks/bench_json.py
+'''
+
+import os, sys, time, json
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoder
+from apis import Page
+from models import Blog, next_id
+
+def make_result(n):
+    blogs = [Blog(id=next_id(), user_id=next_id(), user_name=u'用户%s' % i, user_image='about:blank',
+                  name=u'博客标题 %s' % i, summary=u'摘要' * 20, content=u'正文内容' * 200,
+                  created_at=time.time()) for i in range(n)]
+    return dict(page=Page(n, 1, n), blogs=blogs)
+
+def bench(name, fn, r, rounds):
+    start = time.perf_counter()
+    cpu = time.process_time()
+    for i in range(rounds):
+        body = fn(r)
+    t = (time.perf_counter() - start) / rounds
+    c = (time.process_time() - cpu) / rounds
+    print('%-10s %8.2f ms/response  %8.2f ms cpu  %8d bytes' % (name, t * 1000, c * 1000, len(body)))
+
+if __name__ == '__main__':
+    r = make_result(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
+    bench('baseline', lambda r: json.dumps(r, ensure_ascii=False, default=lambda obj: obj.__dict__).encode('utf8'), r, 50)
+    bench('json', encoder._dumps_json, r, 50)
+    if encoder.orjson is not None:
+        bench('orjson', encoder._dumps_orjson, r, 50)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+'''
+比较逐行Model.save()与批量Model.saveMany()的写入速度(rows/s)。
+
+需要一个可用的MySQL，连接参数取自configs.db：
+    $ cd www && python benchmarks/bench_orm_batch.py 5000
+'''
+
+import os, sys, time, asyncio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orm
+from config import configs
+from models import Blog
+
+def make_blogs(n):
+    return [Blog(user_id='bench', user_name='bench', user_image='about:blank',
+                 name='bench %s' % i, summary='summary', content='content') for i in range(n)]
+
+async def bench(loop, n):
+    await orm.create_pool(loop=loop, **configs.db)
+
+    blogs = make_blogs(n)
+    start = time.perf_counter()
+    for b in blogs:
+        await b.save()
+    t_save = time.perf_counter() - start
+    await Blog.removeMany([b.id for b in blogs])
+
+    blogs = make_blogs(n)
+    start = time.perf_counter()
+    await Blog.saveMany(blogs)
+    t_many = time.perf_counter() - start
+    await Blog.removeMany([b.id for b in blogs])
+
+    print('save()     %8d rows  %8.3fs  %10.0f rows/s' % (n, t_save, n / t_save))
+    print('saveMany() %8d rows  %8.3fs  %10.0f rows/s' % (n, t_many, n / t_many))
+    await orm.destroy_pool()
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(bench(loop, n))
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+'''
+比较aiohttp默认的UrlDispatcher与CompiledRouter在几百条路由下的匹配速度：
+    $ cd www && python benchmarks/bench_router.py 300
+'''
+
+import os, sys, time, asyncio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from coroweb import CompiledRouter
+
+async def handler(request):
+    return web.Response()
+
+# 每个资源生成一组与博客API类似的路由
+def make_routes(n):
+    routes = []
+    for i in range(n // 6):
+        routes.append(('GET', '/api/r%s' % i))
+        routes.append(('POST', '/api/r%s' % i))
+        routes.append(('GET', '/api/r%s/{id}' % i))
+        routes.append(('POST', '/api/r%s/{id}/delete' % i))
+        routes.append(('GET', '/manage/r%s/edit' % i))
+        routes.append(('GET', '/r%s/{id}/comments/{cid}' % i))
+    return routes
+
+def make_requests(n):
+    k = n // 6
+    paths = []
+    for i in range(0, k, max(k // 20, 1)):
+        paths.append(('GET', '/api/r%s' % i))
+        paths.append(('GET', '/api/r%s/0015' % i))
+        paths.append(('POST', '/api/r%s/0015/delete' % i))
+        paths.append(('GET', '/r%s/0015/comments/0016' % i))
+    return [make_mocked_request(m, p) for m, p in paths]
+
+async def bench(router, requests, rounds):
+    start = time.perf_counter()
+    for i in range(rounds):
+        for request in requests:
+            match_info = await router.resolve(request)
+            assert match_info.http_exception is None
+    return rounds * len(requests) / (time.perf_counter() - start)
+
+async def main(n):
+    requests = make_requests(n)
+    for name, router in (('UrlDispatcher', web.UrlDispatcher()), ('CompiledRouter', CompiledRouter())):
+        for method, path in make_routes(n):
+            router.add_route(method, path, handler)
+        # 和app启动时一样冻结router，CompiledRouter在这时编译路由表
+        router.freeze()
+        print('%-16s %5d routes %10.0f resolves/s' % (name, len(make_routes(n)), await bench(router, requests, 2000)))
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    asyncio.run(main(n))
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+'''
+签名token的签发和校验速度：
+    $ cd www && python benchmarks/bench_session.py 100000
+'''
+
+import os, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import session
+from models import User
+
+def bench(name, fn, n):
+    start = time.perf_counter()
+    for i in range(n):
+        fn()
+    print('%-12s %10.0f ops/s' % (name, n / (time.perf_counter() - start)))
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    user = User(id='0015000000000000000000000000000000000000000000000', name=u'测试', image='about:blank', admin=False)
+    token = session.user2token(user)
+    bench('sign', lambda: session.user2token(user), n)
+    bench('verify', lambda: session.verify_token(token), n)
+    bench('token2user', lambda: session.token2user(token), n)
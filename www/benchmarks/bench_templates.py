@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+'''
+测量模板的启动(编译全部模板)时间和渲染时间，比较开发配置与生产配置
+(auto_reload=False + FileSystemBytecodeCache)：
+    $ cd www && python benchmarks/bench_templates.py
+'''
+
+import os, sys, time, shutil, tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+from fragment import FragmentCacheExtension
+import assets
+
+path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+
+def make_env(auto_reload, bytecode_cache=None):
+    env = Environment(loader=FileSystemLoader(path), extensions=[FragmentCacheExtension], autoescape=True, auto_reload=auto_reload,
+                      bytecode_cache=FileSystemBytecodeCache(bytecode_cache) if bytecode_cache else None)
+    env.filters['datetime'] = lambda t: t
+    # __base__.html用static_url生成静态文件URL，测量时不需要真实的hash
+    env.globals['static_url'] = assets.static_url_for({})
+    return env
+
+def startup(env):
+    start = time.perf_counter()
+    for name in env.list_templates():
+        env.get_template(name)
+    return time.perf_counter() - start
+
+def render(env, rounds=2000):
+    blogs = [dict(id=str(i), name='blog %s' % i, summary='summary', created_at=time.time()) for i in range(10)]
+    start = time.perf_counter()
+    for i in range(rounds):
+        env.get_template('blogs.html').render(blogs=blogs, __user__=None)
+    return (time.perf_counter() - start) / rounds
+
+if __name__ == '__main__':
+    cache_dir = tempfile.mkdtemp()
+    try:
+        print('startup, no bytecode cache       %8.2f ms' % (startup(make_env(True)) * 1000))
+        startup(make_env(False, cache_dir))
+        print('startup, warm bytecode cache     %8.2f ms' % (startup(make_env(False, cache_dir)) * 1000))
+        print('render, auto_reload=True         %8.3f ms' % (render(make_env(True)) * 1000))
+        print('render, auto_reload=False        %8.3f ms' % (render(make_env(False)) * 1000))
+    finally:
+        shutil.rmtree(cache_dir)
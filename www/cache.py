@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import time
+from collections import OrderedDict
+
+class LRUCache(object):
+    '''
+    In-process cache with LRU eviction and optional per-entry ttl (seconds).
+    >>> c = LRUCache(maxsize=2)
+    >>> c.set('a', 1); c.set('b', 2); c.get('a')
+    1
+    >>> c.set('c', 3)
+    >>> c.get('b') is None
+    True
+    >>> len(c)
+    2
+    '''
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key => (value, expires)，OrderedDict的顺序就是最近使用的顺序，最久未使用的在最前面
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        value, expires = item
+        if expires is not None and expires < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        return dict(size=len(self._data), maxsize=self.maxsize, hits=self.hits, misses=self.misses, evictions=self.evictions)
+
+    def __contains__(self, key):
+        item = self._data.get(key)
+        return item is not None and (item[1] is None or item[1] >= time.monotonic())
+
+    def __len__(self):
+        return len(self._data)
@@ -8,9 +8,62 @@ configs = {
         'port': 3306,
         'user': 'www-data',
         'password': 'www-data',
-        'db': 'awesome'
+        'db': 'awesome',
+        'maxsize': 10,
+        'minsize': 1,
+        # 连接的最长复用时间(秒)，应小于MySQL的wait_timeout，-1表示不回收
+        'pool_recycle': 3600,
+        # 等待空闲连接的最长时间(秒)，None表示一直等待
+        'acquire_timeout': 5,
+        # 慢查询阈值(秒)，超过的语句记录warning日志
+        'slow_query': 0.5,
+        # 只读副本，每一项只写与主库不同的配置，例如[{'host': '10.0.0.2'}]；select走副本，写操作和事务走主库
+        'replicas': [],
+        # 选择副本的策略：round_robin或least_busy
+        'replica_strategy': 'round_robin'
+    },
+    'templates': {
+        # 开发环境：修改模板后立即生效。生产环境在config_override.py中设为False，
+        # 并设置bytecode_cache目录和warmup=True
+        'auto_reload': True,
+        'cache_size': 400,
+        'bytecode_cache': None,
+        'warmup': False,
+        # {% cache %}片段缓存最多保存的片段个数
+        'fragment_cache_size': 1000
+    },
+    'response_cache': {
+        # @get('/path', cache=秒数)的响应缓存最多保存多少个页面
+        'maxsize': 1000,
+        # 过期后stale秒内仍返回旧内容，同时在后台重新渲染
+        'stale': 60
+    },
+    'static': {
+        # 静态文件的Cache-Control: max-age(秒)
+        'max_age': 86400
+    },
+    'compression': {
+        # 小于min_size字节的响应不压缩
+        'min_size': 1024,
+        # gzip压缩级别(1-9)和brotli质量(0-11)
+        'level': 6,
+        'br_quality': 5
+    },
+    'log': {
+        # 日志级别，生产环境用INFO；DEBUG会输出每条SQL和每个请求的参数、返回值
+        'level': 'INFO',
+        # access log的抽样比例(0-1)，1表示每个请求都记录；status>=500的请求总是记录
+        'sample': 1.0
     },
     'session': {
-        'secret': 'AwEsOmE'
+        'secret': 'AwEsOmE',
+        # 签名token的密钥：key id => secret，current_key用于签发新token。
+        # 轮换时添加新key并修改current_key，旧key保留到它签发的token过期后再删除。为空时使用secret
+        'keys': {},
+        'current_key': None,
+        # 登录状态缓存：最多缓存的cookie个数，缓存秒数(应小于cookie的有效期)，无效cookie的缓存秒数
+        'cache_size': 10000,
+        'cache_ttl': 300,
+        'negative_ttl': 60
     }
 }
\ No newline at end of file
@@ -1,21 +1,35 @@
 # -*- coding: utf-8 -*-
 
-import asyncio, os, inspect, logging, functools
-from urllib import parse
+import os, inspect, logging, functools, hashlib
 from aiohttp import web
-from apis import APIError
+from apis import APIError, APIValueError
 
-def get(path):
+# @get/@post返回的包装函数总是协程函数：asyncio.coroutine在Python 3.11中已经删除，普通函数的视图在这里包装
+def coroutine_view(func):
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kw):
+            return (await func(*args, **kw))
+    else:
+        @functools.wraps(func)
+        async def wrapper(*args, **kw):
+            return func(*args, **kw)
+    return wrapper
+
+def get(path, cache=None, auth=True):
     '''
-    Define decorator @get('/path')
+    Define decorator @get('/path'), or @get('/path', cache=30) to cache anonymous responses for 30 seconds,
+    @get('/path', auth=False) for views that never use request.__user__
     '''
 
     def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args,**kw):
-            return func(*args,**kw)
+        wrapper = coroutine_view(func)
         wrapper.__method__='GET'
         wrapper.__route__=path
+        if cache:
+            wrapper.__cache_ttl__=cache
+        if not auth:
+            wrapper.__auth__=False
         return wrapper
     return decorator
 
@@ -25,14 +39,52 @@ def post(path):
     '''
 
     def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args,**kw):
-            return func(*args,**kw)
+        wrapper = coroutine_view(func)
         wrapper.__method__='POST'
         wrapper.__route__=path
         return wrapper
     return decorator
 
+def make_etag(data):
+    ' strong ETag from bytes or str. '
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return '"%s"' % hashlib.md5(data).hexdigest()
+
+# 压缩后的响应在ETag后面加上编码，例如"abc-gzip"，比较时去掉
+def strip_etag_encoding(tag):
+    for suffix in ('-gzip"', '-br"'):
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)] + '"'
+    return tag
+
+# If-None-Match使用弱比较(RFC 7232)：nginx等代理压缩响应时会把ETag改成W/"..."
+def strip_weak(tag):
+    return tag[2:] if tag.startswith('W/') else tag
+
+def is_not_modified(request, etag=None, last_modified=None):
+    ' check If-None-Match / If-Modified-Since against etag and last_modified (unix time). '
+    inm = request.headers.get('If-None-Match')
+    if inm is not None:
+        # 有If-None-Match时忽略If-Modified-Since
+        return etag is not None and (inm.strip() == '*' or etag in [strip_etag_encoding(strip_weak(t.strip())) for t in inm.split(',')])
+    if last_modified is not None and request.if_modified_since is not None:
+        return int(last_modified) <= request.if_modified_since.timestamp()
+    return False
+
+def check_modified(request, version, last_modified=None):
+    '''
+    Let a view skip rendering when the client already has this version of the data:
+        check_modified(request, blog.created_at, last_modified=blog.created_at)
+    Raise 304 Not Modified if it matches, otherwise the version ETag is used for the response.
+    '''
+    etag = make_etag(str(version))
+    request['__etag__'] = etag
+    request['__last_modified__'] = last_modified
+    if is_not_modified(request, etag, last_modified):
+        headers = {'ETag': etag}
+        raise web.HTTPNotModified(headers=headers)
+
 # inspect模块用来获取类或函数的参数的信息
 # inspect.signature（fn)将返回一个inspect.Signature类型的对象，值为fn这个函数的所有参数
 # inspect.Signature对象的paramerters属性是一个mappingproxy（映射）类型的对象，值为一个有序字典（Orderdict)
@@ -91,6 +143,37 @@ def has_request_arg(fn):
             raise ValueError('request parameter must be the last named parameter in function: %s%s' % (fn.__name__, str(sig)))
     return found
 
+# 根据参数注解转换参数类型，例如 def api_blogs(*, page: int = 1)
+# url和表单里的值都是字符串，转换失败抛出APIValueError，视图函数不会被调用
+def to_bool(value):
+    if isinstance(value, bool):
+        return value
+    v = str(value).lower()
+    if v in ('1', 'true', 'yes', 'on'):
+        return True
+    if v in ('', '0', 'false', 'no', 'off'):
+        return False
+    raise ValueError('invalid bool value: %s' % value)
+
+CONVERTERS = {
+    int: int,
+    float: float,
+    bool: to_bool,
+    str: str
+}
+
+#收集带有可转换类型注解的参数：((参数名, 转换函数), ...)
+def get_converters(fn):
+    args = []
+    params = inspect.signature(fn).parameters
+    for name, param in params.items():
+        if name == 'request' or param.kind in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD):
+            continue
+        convert = CONVERTERS.get(param.annotation, None)
+        if convert is not None:
+            args.append((name, convert))
+    return tuple(args)
+
 # 定义RequestHandler从视图函数中分析其需要接受的参数，从web.Request中获取必要的参数
 # 调用视图函数，然后把结果转换为web.Response对象，符合aiohttp框架要求
 class RequestHandler(object):
@@ -102,6 +185,22 @@ class RequestHandler(object):
         self._has_named_kw_args = has_named_kw_args(fn)
         self._named_kw_args = get_named_kw_args(fn)
         self._required_kw_args = get_required_kw_args(fn)
+        # 注册时就确定好参数的来源，请求时按视图函数声明的参数直接取值：
+        # 没有关键字参数的视图只取match_info；只有命名关键字参数的视图只读取声明过的参数名
+        self._reads_params = bool(self._has_var_kw_arg or self._has_named_kw_args)
+        self._read_query = self._query_all if self._has_var_kw_arg else self._query_named
+        self._converters = get_converters(fn)
+        # @get('/path', cache=秒数)声明的响应缓存时间，由app.py的cache_factory读取
+        self._cache_ttl = getattr(fn, '__cache_ttl__', None)
+        # @get('/path', auth=False)声明视图不需要当前用户，auth_factory不解析cookie
+        self._auth = getattr(fn, '__auth__', True)
+
+    # 读取url中?后面的参数，同名参数只取第一个值
+    def _query_all(self, query):
+        return {k: query[k] for k in query.keys()}
+
+    def _query_named(self, query):
+        return {name: query[name] for name in self._named_kw_args if name in query}
 
     # 1.定义kw，用于保存参数
     # 2.判断视图函数是否存在关键词参数，如果存在根据POST或者GET方法将request请求内容保存到kw
@@ -109,64 +208,55 @@ class RequestHandler(object):
     # 4.完善_has_request_arg和_required_kw_args属性
     async def __call__(self, request):
         kw = None
-        logging.info('call started!!!' )
-        if self._has_var_kw_arg or self._has_named_kw_args or self._required_kw_args:
+        if self._reads_params:
             if request.method == 'POST':
                 # 根据request参数中的content_type使用不同解析方法：
                 if not request.content_type:    # 如果content_type不存在，返回400错误
-                    return web.HTTPBadRequest('Missing Content-Type.')
+                    return web.HTTPBadRequest(text='Missing Content-Type.')
                 ct = request.content_type.lower()       # 小写，便于检查
                 if ct.startswith('application/json'):   # json格式数据
                     params = await request.json()       # 仅解析body字段的json数据
                     if not isinstance(params, dict):    # request.json()返回dict对象
-                        return web.HTTPBadRequest('JSON body must be object.')
+                        return web.HTTPBadRequest(text='JSON body must be object.')
                     kw = params
                 # form表单请求的编码形式
                 elif ct.startswith('application/x-www-form-urlencoded') or ct.startswith('multipart/form-data'):
                     params = await request.post()    # 返回post的内容中解析后的数据。dict-like对象。
                     kw = dict(**params)     # 组成dict，统一kw格式
                 else:
-                    return web.HTTPBadRequest('Unsupported Content-Type: %s' % request.content_type)
-            if request.method == 'GET':
-                qs = request.query_string   # 它得到的是url中？后面所有的值，为一个字符串，即：wzd=111&abc=cc
-                if qs:                      # 这些key-value也是一些有用的参数
-                    kw = dict()
-                    '''''
-                    解析url中?后面的键值对的内容 
-                    qs = 'first=f,s&second=s' 
-                    parse.parse_qs(qs, True).items() 
-                    >>> dict([('first', ['f,s']), ('second', ['s'])]) 
-                    '''
-                    for k, v in parse.parse_qs(qs, True).items():   #返回查询变量和值的映射，dict对象。True表示不忽略空格。
-                        kw[k] = v[0]
+                    return web.HTTPBadRequest(text='Unsupported Content-Type: %s' % request.content_type)
+                # 若视图函数只有命名关键词参数没有关键词参数，只保留命名关键词参数
+                if not self._has_var_kw_arg:
+                    kw = {name: kw[name] for name in self._named_kw_args if name in kw}
+            elif request.method == 'GET':
+                # request.query是aiohttp已经解析好的url参数，不需要再用parse.parse_qs解析query_string
+                kw = self._read_query(request.query)
+        match_info = request.match_info
         if kw is None:  # 若request中无参数
             # request.match_info返回dict对象。可变路由中的可变字段{variable}为参数名，传入request请求的path为值
             # 若存在可变路由：/a/{name}/c，可匹配path为：/a/jack/c的request
             # 则reqwuest.match_info返回{name = jack}
-            kw = dict(**request.match_info)
-        else:   # request有参数
-            # 若视图函数只有命名关键词参数没有关键词参数
-            if not self._has_var_kw_arg and self._named_kw_args:
-                # 只保留命名关键词参数
-                copy = dict()
-                for name in self._named_kw_args:
-                    if name in kw:
-                        copy[name] = kw[name]
-                kw = copy    # kw中只存在命名关键词参数
-            # 将request.match_info中的参数传入kw
-            for k, v in request.match_info.items():
+            kw = dict(**match_info)
+        elif match_info:   # 将request.match_info中的参数传入kw
+            for k, v in match_info.items():
                 if k in kw:
                     logging.warning('Duplicate arg name in named arg and kw args: %s' % k)
                 kw[k] = v
         if self._has_request_arg:
             kw['request'] = request
         # check required kw:
-        if self._required_kw_args:  # 视图函数存在无默认值的命名关键词参数
-            for name in self._required_kw_args:
-                if not name in kw:   # 若未传入必须参数值，报错
-                    return web.HTTPBadRequest('Missing argument: %s' % name)
-        logging.info('call with args: %s' % str(kw))
+        for name in self._required_kw_args:  # 视图函数存在无默认值的命名关键词参数
+            if not name in kw:   # 若未传入必须参数值，报错
+                return web.HTTPBadRequest(text='Missing argument: %s' % name)
+        logging.debug('call with args: %s', kw)
         try:
+            # 按参数注解转换类型，不合法的参数在调用视图函数之前就被拒绝
+            for name, convert in self._converters:
+                if name in kw:
+                    try:
+                        kw[name] = convert(kw[name])
+                    except (ValueError, TypeError):
+                        raise APIValueError(name, 'Invalid value for %s: %s' % (name, kw[name]))
             # 至此，kw为视图函数fn真正能调用的参数
             # request请求中的参数，终于传递给了视图函数
             r = await self._func(**kw)
@@ -174,11 +264,164 @@ class RequestHandler(object):
         except APIError as e:
             return dict(error=e.error, data=e.data, message=e.message)
 
+# 编译好的路由表：
+# 1. 静态路径(不含{})放在dict里，按 path => {method: route} 一次查找
+# 2. 含{name}参数的路径按'/'切分成段，放进一棵前缀树，每一段先匹配静态子节点，再匹配参数节点
+# add_resource时记录资源(add_route、add_get、add_post等都经过add_resource)，router冻结(app启动)时
+# 再按method整理成查找表，所以不管用哪种方式注册、路由是什么时候加到资源上的都会被编译。
+# {name:regex}这类路由、静态文件和找不到的情况仍交给aiohttp默认的resolve，所以url_for、405等行为与UrlDispatcher一致。
+# 用法：web.Application(router=CompiledRouter(), ...)。注意aiohttp 3.x对router参数会给出DeprecationWarning，
+# 目前没有其他公开的方式替换router
+class _Node(object):
+    __slots__ = ('children', 'param', 'param_node', 'resources', 'routes')
+
+    def __init__(self):
+        self.children = {}      # 静态段 => _Node
+        self.param = None       # 参数名
+        self.param_node = None  # 参数段对应的_Node
+        self.resources = None   # 完整路径的末端节点上注册的资源
+        self.routes = None      # method => route，freeze时由resources生成
+
+def _method_map(resources):
+    routes = {}
+    for resource in resources:
+        for route in resource:
+            routes.setdefault(route.method, route)
+    return routes
+
+class CompiledRouter(web.UrlDispatcher):
+
+    def __init__(self):
+        super().__init__()
+        self._static_resources = {}
+        self._static_routes = {}
+        self._root = _Node()
+        self._compiled = False
+
+    def add_resource(self, path, *, name=None):
+        resource = super().add_resource(path, name=name)
+        resources = self._resources_for(path)
+        # 同一路径连续注册时aiohttp会复用上一个资源
+        if resources is not None and resource not in resources:
+            resources.append(resource)
+        return resource
+
+    def _resources_for(self, path):
+        if '{' not in path and '}' not in path:
+            return self._static_resources.setdefault(path or '/', [])
+        node = self._root
+        for seg in path.split('/')[1:]:
+            if seg.startswith('{') and seg.endswith('}') and seg.count('{') == 1:
+                name = seg[1:-1]
+                if ':' in name or (node.param is not None and node.param != name):
+                    return None    # 带正则的参数或同一位置参数名不同，交给默认的resolve处理
+                if node.param_node is None:
+                    node.param = name
+                    node.param_node = _Node()
+                node = node.param_node
+            elif '{' in seg or '}' in seg:
+                return None    # 例如/blog/{id}.json，交给默认的resolve处理
+            else:
+                node = node.children.setdefault(seg, _Node())
+        if node.resources is None:
+            node.resources = []
+        return node.resources
+
+    def freeze(self):
+        super().freeze()
+        self._static_routes = {path: _method_map(resources) for path, resources in self._static_resources.items()}
+        self._compile(self._root)
+        self._compiled = True
+
+    def _compile(self, node):
+        if node.resources is not None:
+            node.routes = _method_map(node.resources)
+        for child in node.children.values():
+            self._compile(child)
+        if node.param_node is not None:
+            self._compile(node.param_node)
+
+    async def resolve(self, request):
+        if not self._compiled:
+            return await super().resolve(request)
+        path = request.rel_url.path_safe
+        routes = self._static_routes.get(path)
+        match_dict = {}
+        if routes is None:
+            routes = self._match(self._root, path.split('/')[1:], 0, match_dict)
+        if routes is not None:
+            route = routes.get(request.method) or routes.get('*')
+            if route is not None:
+                return web.UrlMappingMatchInfo(match_dict, route)
+        return await super().resolve(request)
+
+    def _match(self, node, segs, i, match_dict):
+        if i == len(segs):
+            return node.routes
+        seg = segs[i]
+        child = node.children.get(seg)
+        if child is not None:
+            routes = self._match(child, segs, i + 1, match_dict)
+            if routes is not None:
+                return routes
+        if node.param_node is not None and seg:
+            routes = self._match(node.param_node, segs, i + 1, match_dict)
+            if routes is not None:
+                # path_safe中只有%2F和%25还保持编码，与aiohttp的DynamicResource一样还原
+                match_dict[node.param] = seg.replace('%2F', '/').replace('%25', '%') if '%' in seg else seg
+                return routes
+        return None
+
+# 可以被跳过的middleware：用@bypassable('auth')装饰middleware函数(变成aiohttp的new-style middleware)，
+# 用skip_middlewares(resource, names)声明匹配到该资源的请求跳过哪些middleware，直接交给下一层处理。
+# 全部是new-style middleware时aiohttp按handler缓存组装好的middleware链，每个请求不再调用工厂函数；
+# 包装函数不是协程，直接返回下一层的awaitable，不会给每一层多加一个协程。
+# 按route对象查字典(route => 要跳过的middleware名)，比经过request.app查找便宜
+_bypass = {}
+
+def skip_middlewares(resource, names):
+    names = frozenset(names)
+    for route in resource:
+        _bypass[route] = names
+
+def bypassable(name):
+    def decorator(fn):
+        @web.middleware
+        @functools.wraps(fn)
+        def middleware(request, handler):
+            if _bypass and name in _bypass.get(request.match_info.route, ()):
+                return handler(request)
+            return fn(request, handler)
+        return middleware
+    return decorator
+
+# 静态文件默认跳过的middleware：不需要日志、用户、渲染，也已经预先压缩
+STATIC_BYPASS = ('logger', 'identity', 'auth', 'data', 'compress', 'etag', 'cache', 'response')
+
 #添加静态文件，如：images,css,javascript等
-def add_static(app):
+# bypass：静态文件请求跳过的middleware；max_age：Cache-Control的缓存秒数
+# 带?v=<hash>指纹的静态文件URL内容永不改变，可以让浏览器缓存一年且不再验证
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+def add_static(app, bypass=STATIC_BYPASS, max_age=None, manifest=None):
     # 拼接static文件目录
     path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
-    app.router.add_static('/static/', path)
+    # 运行过assets.py生成.gz/.br文件后，aiohttp会在客户端支持时直接返回压缩好的文件
+    resource = app.router.add_static('/static/', path, name='static')
+    if bypass:
+        skip_middlewares(resource, bypass)
+    if max_age or manifest:
+        cache_control = 'public, max-age=%s' % max_age if max_age else None
+        async def static_headers(request, response):
+            if not request.path.startswith('/static/') or response.status != 200:
+                return
+            version = request.query.get('v')
+            # 只有hash和当前文件一致时才标记immutable，旧hash的URL拿到的是新内容，不能长期缓存
+            if version and manifest and manifest.get(request.path[len('/static/'):]) == version:
+                response.headers['Cache-Control'] = IMMUTABLE
+            elif cache_control:
+                response.headers['Cache-Control'] = cache_control
+        app.on_response_prepare.append(static_headers)
     logging.info('add static %s => %s' % ('/static/', path))
 
 '''
@@ -192,12 +435,16 @@ def add_route(app, fn): # 编写一个add_route函数，用来注册一个视图
     if path is None or method is None:
         raise ValueError('@get or @post not defined in %s.' % str(fn))
 
-    # 判断URL处理函数是否协程并且是生成器
-    if not asyncio.iscoroutinefunction(fn) and not inspect.isgeneratorfunction(fn):
-        fn = asyncio.coroutine(fn)  # 将fn转变成协程
+    if not inspect.iscoroutinefunction(fn):
+        raise ValueError('%s is not a coroutine function, decorate it with @get or @post.' % str(fn))
     logging.info('add route %s %s => %s(%s)' % (method, path, fn.__name__, ', '.join(inspect.signature(fn).parameters.keys())))
-    # 在app中注册经RequestHandler类封装的视图函数
-    app.router.add_route(method, path, RequestHandler(app, fn))
+    # 在app中注册经RequestHandler类封装的视图函数。
+    # aiohttp只直接调用协程函数，RequestHandler实例会被当作已废弃的普通函数再包一层，并要求返回StreamResponse，
+    # 所以注册一个协程函数；update_wrapper把_cache_ttl、_auth等属性复制过来，middleware从match_info.handler读取
+    handler = RequestHandler(app, fn)
+    async def route_handler(request):
+        return (await handler(request))
+    app.router.add_route(method, path, functools.update_wrapper(route_handler, handler, assigned=()))
 
 # 导入模块，批量注册视图函数
 def add_routes(app, module_name):
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+'''
+JSON encoding for API responses.
+
+dumps() returns utf-8 bytes ready for web.Response(body=...). It uses orjson when it
+is installed and falls back to the standard json module otherwise.
+'''
+
+import json
+
+from apis import Page, APIError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Model继承自dict，两种后端都能直接序列化；Page和APIError需要转换
+def default(obj):
+    if isinstance(obj, Page):
+        return obj.__dict__
+    if isinstance(obj, APIError):
+        return dict(error=obj.error, data=obj.data, message=obj.message)
+    # 与原来default=lambda obj: obj.__dict__的行为保持一致
+    if hasattr(obj, '__dict__'):
+        return obj.__dict__
+    raise TypeError('Object of type %s is not JSON serializable' % obj.__class__.__name__)
+
+def _dumps_json(obj):
+    return json.dumps(obj, ensure_ascii=False, default=default).encode('utf-8')
+
+def _dumps_orjson(obj):
+    return orjson.dumps(obj, default=default)
+
+dumps = _dumps_orjson if orjson is not None else _dumps_json
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+'''
+Jinja2 extension for fragment caching:
+
+    {% cache 'sidebar', 300 %}
+        ...
+    {% endcache %}
+
+The rendered fragment is stored in env.fragment_cache under the given key for ttl
+seconds (no ttl means until evicted). env.fragment_cache can be replaced by any
+object with get(key) and set(key, value, ttl), by default it's an in-process LRUCache.
+
+Nothing invalidates a fragment before its ttl, so only cache blocks whose key changes
+whenever the content does (a real version such as an updated timestamp), or static
+content. Blocks that use time-relative filters such as datetime are not worth caching.
+'''
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+from cache import LRUCache
+
+class FragmentCacheExtension(Extension):
+
+    tags = set(['cache'])
+
+    def __init__(self, environment):
+        super(FragmentCacheExtension, self).__init__(environment)
+        environment.extend(fragment_cache=LRUCache(1000))
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        # {% cache key[, ttl] %}
+        args = [parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cache_support', args), [], [], body).set_lineno(lineno)
+
+    def _cache_support(self, key, ttl, caller):
+        cache = self.environment.fragment_cache
+        rv = cache.get(key)
+        if rv is None:
+            rv = caller()
+            cache.set(key, rv, ttl)
+        return rv
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+
+'''
+/metrics：以Prometheus文本格式输出连接池和sql的运行数据，用来确定连接池的大小。
+'''
+
+import orm
+from aiohttp import web
+from coroweb import get
+
+@get('/metrics')
+async def metrics():
+    L = []
+    stats = orm.pool_stats()
+    for k in ('size', 'free', 'used', 'minsize', 'maxsize'):
+        L.append('# TYPE db_pool_%s gauge' % k)
+        for name, v in stats.items():
+            L.append('db_pool_%s{pool="%s"} %s' % (k, name, v[k]))
+    L.append(orm.acquire_time.render())
+    L.append(orm.query_time.render())
+    return web.Response(text='\n'.join(L) + '\n', content_type='text/plain')
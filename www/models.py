@@ -23,6 +23,8 @@ class User(Model):
 
 class Blog(Model):
     __table__='blogs'
+    # 博客很少修改，find()走进程内缓存
+    __cache__ = dict(ttl=60, maxsize=10000)
 
     id=StringField(primary_key=True,default=next_id, ddl='varchar(50)')
     user_id = StringField(ddl='varchar(50)')
@@ -1,17 +1,113 @@
 # -*- coding: utf-8 -*-
 
-import aiomysql, asyncio,logging
+import aiomysql, asyncio,logging, contextlib, contextvars, time
+from cache import LRUCache
 
 def log(sql, args=()):
-    logging.info('SQL: %s' % sql)
+    logging.debug('SQL: %s', sql)
+
+# SQL语句缓存：原始sql => 把?替换成%s后的sql
+# Model的sql模板是由ModelMetaclass生成的固定语句，findAll的where也大多是带?的模板，
+# 所以同一条sql只需要转换一次，之后直接查字典即可。
+# 为了防止拼接了具体值的sql把缓存撑爆，设置一个上限，超过上限后不再缓存新的语句
+_STATEMENT_CACHE_SIZE = 1024
+_statements = {}
+
+def statement(sql):
+    ' translate ? placeholders to %s, cached by the original sql. '
+    stmt = _statements.get(sql)
+    if stmt is None:
+        stmt = sql.replace('?', '%s')
+        if len(_statements) < _STATEMENT_CACHE_SIZE:
+            _statements[sql] = stmt
+    return stmt
+
+# 耗时分布的直方图，按Prometheus的格式输出，单位秒
+class Histogram(object):
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, doc):
+        self.name = name
+        self.doc = doc
+        self.counts = [0] * (len(self.BUCKETS) + 1)    # 最后一个是+Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = 0
+        for bound in self.BUCKETS:
+            if value <= bound:
+                break
+            i = i + 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self):
+        L = ['# HELP %s %s' % (self.name, self.doc), '# TYPE %s histogram' % self.name]
+        n = 0
+        for bound, c in zip(self.BUCKETS + ('+Inf',), self.counts):
+            n = n + c
+            L.append('%s_bucket{le="%s"} %s' % (self.name, bound, n))
+        L.append('%s_sum %s' % (self.name, self.sum))
+        L.append('%s_count %s' % (self.name, self.count))
+        return '\n'.join(L)
+
+acquire_time = Histogram('db_pool_acquire_seconds', 'Time spent waiting for a pooled connection.')
+query_time = Histogram('db_query_seconds', 'Time spent executing sql statements.')
+
+# 超过slow_query秒的语句以warning级别记录，acquire_timeout秒内拿不到连接则抛出asyncio.TimeoutError
+# 两者都在create_pool时从configs.db读取，None表示不启用
+_slow_query = None
+_acquire_timeout = None
+
+# 当前请求执行的SQL条数和总耗时[count, seconds]，由logger_factory调用track_queries()开始统计，写入access log
+_query_stats = contextvars.ContextVar('query_stats', default=None)
+
+def track_queries():
+    ' start counting queries in the current context, return the [count, seconds] list observe_query updates. '
+    stats = [0, 0.0]
+    _query_stats.set(stats)
+    return stats
+
+def observe_query(sql, elapsed):
+    query_time.observe(elapsed)
+    stats = _query_stats.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += elapsed
+    if _slow_query is not None and elapsed >= _slow_query:
+        logging.warning('slow query (%.3fs): %s', elapsed, sql)
+
+# 只读副本的连接池，select优先走副本，execute和事务始终走主库
+__replicas = []
+# 选择副本的策略：round_robin轮流使用，least_busy选正在使用的连接最少的
+_replica_strategy = 'round_robin'
+_next_replica = 0
+
+# 本次请求(或任务)里已经执行过写操作：之后的读也走主库，避免因为复制延迟读不到刚写入的数据
+_wrote = contextvars.ContextVar('wrote', default=False)
 
 #创建pool
-@asyncio.coroutine
-def create_pool(loop, **kw):
+async def create_pool(loop, **kw):
     logging.info('create database connection pool...')
     # 全局变量,如果在函数内部修改外部变量,需声明为全局变量
-    global __pool
-    __pool = yield from aiomysql.create_pool(
+    global __pool, __replicas, _slow_query, _acquire_timeout, _replica_strategy
+    _slow_query = kw.get('slow_query', None)
+    _acquire_timeout = kw.get('acquire_timeout', None)
+    _replica_strategy = kw.get('replica_strategy', 'round_robin')
+    __pool = await _create_pool(loop, **kw)
+    # replicas是一个list，每一项只需写出与主库不同的配置，例如[{'host': '10.0.0.2'}]
+    __replicas = []
+    for replica in kw.get('replicas', None) or ():
+        logging.info('create replica connection pool: %s', replica.get('host'))
+        params = dict(kw)
+        params.update(replica)
+        __replicas.append(await _create_pool(loop, **params))
+
+async def _create_pool(loop, **kw):
+    return await aiomysql.create_pool(
         host = kw.get('host','localhost'),
         port = kw.get('port',3306),
         user = kw['user'],
@@ -21,42 +117,181 @@ def create_pool(loop, **kw):
         autocommit = kw.get('autocommit',True),
         maxsize = kw.get('maxsize', 10),
         minsize = kw.get('minsize', 1),
+        # 连接空闲超过pool_recycle秒后重建，避免使用已被MySQL的wait_timeout断开的连接，-1表示不回收
+        pool_recycle = kw.get('pool_recycle', -1),
         loop = loop
     )
 
+# 为读操作选择连接池：没有副本、或者本次请求已经写过时使用主库
+def _read_pool():
+    global _next_replica
+    if not __replicas or _wrote.get():
+        return __pool
+    if _replica_strategy == 'least_busy':
+        return min(__replicas, key=lambda p: p.size - p.freesize)
+    _next_replica = (_next_replica + 1) % len(__replicas)
+    return __replicas[_next_replica]
+
+# 连接池状态：size为已创建的连接数，free为空闲连接数，used为正在使用的连接数
+# 返回 名称 => 状态，主库为primary，副本依次为replica0, replica1...
+def pool_stats():
+    pools = [('primary', __pool)] + [('replica%s' % i, p) for i, p in enumerate(__replicas)]
+    return dict((name, dict(size=p.size, free=p.freesize, used=p.size - p.freesize,
+                            minsize=p.minsize, maxsize=p.maxsize)) for name, p in pools)
+
+# 从连接池中取出一个连接，记录等待的时间，用完后归还
+@contextlib.asynccontextmanager
+async def acquire(pool):
+    start = time.perf_counter()
+    if _acquire_timeout:
+        conn = await asyncio.wait_for(pool.acquire(), _acquire_timeout)
+    else:
+        conn = await pool.acquire()
+    acquire_time.observe(time.perf_counter() - start)
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+# 当前事务固定使用的连接。transaction()块内的select/execute以及Model的方法都走这个连接，
+# 块外为None，每次操作从连接池里取一个连接
+_tx_conn = contextvars.ContextVar('tx_conn', default=None)
+# 当前事务中写过的行：[(Model类, 写入的主键, 删除的主键)]。提交之后才让缓存失效，
+# 否则提交前并发的请求会把旧数据重新放进缓存；回滚时从identity map中去掉未提交的实例
+_tx_changes = contextvars.ContextVar('tx_changes', default=None)
+
+# 获取连接：在事务中返回事务连接，否则从连接池中取出，用完后自动归还
+# read=True时可以使用只读副本(replica=False时读主库)；写操作会标记本次请求，之后的读也回到主库
+@contextlib.asynccontextmanager
+async def connection(read=False, replica=True):
+    conn = _tx_conn.get()
+    if conn is not None:
+        yield conn
+        return
+    if read:
+        pool = _read_pool() if replica else __pool
+    else:
+        pool = __pool
+        _wrote.set(True)
+    async with acquire(pool) as conn:
+        yield conn
+
+# 事务：整个块固定使用同一个连接，结束时只提交一次，出现异常则回滚
+# 用法：
+#     async with orm.transaction():
+#         await blog.save()
+#         await comment.save()
+# 嵌套的transaction()并入最外层的事务
+@contextlib.asynccontextmanager
+async def transaction():
+    conn = _tx_conn.get()
+    if conn is not None:
+        yield conn
+        return
+    _wrote.set(True)
+    async with acquire(__pool) as conn:
+        await conn.begin()
+        token = _tx_conn.set(conn)
+        changes = []
+        changes_token = _tx_changes.set(changes)
+        try:
+            yield conn
+        except BaseException:
+            await conn.rollback()
+            for cls, saved, removed in changes:
+                cls._discard(saved)
+            raise
+        else:
+            try:
+                await conn.commit()
+            finally:
+                for cls, saved, removed in changes:
+                    cls._invalidate(saved, removed)
+        finally:
+            _tx_changes.reset(changes_token)
+            _tx_conn.reset(token)
+
 #查看数据库数据的函数(第一个参数为sql语句,第二个则是占位符对应的参数)
-async def select(sql, args, size=None):
+async def select(sql, args, size=None, replica=True):
     log(sql,args)
-    global __pool
-    async with __pool.get() as conn:
+    async with connection(read=True, replica=replica) as conn:
         async with conn.cursor(aiomysql.DictCursor) as cur:
-            # mysql使用%s作为占位符,sql使用的是?作为占位符,使用replace()函数替换掉,
+            # mysql使用%s作为占位符,sql使用的是?作为占位符,由statement()完成替换并缓存结果,
             # 后面就是占位符对应的参数,这里巧妙的使用了or关键字的短路原理,左为真返回左,否则返回or右边的
-            await cur.execute(sql.replace('?','%s'), args or ())
+            start = time.perf_counter()
+            await cur.execute(statement(sql), args or ())
             if size:
                 #fetchmany()方法可以获得多条数据，但需要指定数据的条数
                 # 一次性返回size条查询结果，结果是一个list，里面是tuple
                 rs = await cur.fetchmany(size)
             else:
                 rs = await cur.fetchall()
+            observe_query(sql, time.perf_counter() - start)
         # 关闭游标，不用手动关闭conn，因为是在with语句里面，会自动关闭，因为是select，所以不需要提交事务(commit)
-        logging.info('rows returned: %s' % len(rs))
+        logging.debug('rows returned: %s', len(rs))
         return rs
 
+#流式查询：使用服务端游标(SSDictCursor)，每次只从MySQL读取batch条记录，
+# 内存占用与表的大小无关。迭代结束前该连接不能执行其他语句，所以不要在事务里一边迭代一边写
+async def select_iter(sql, args, batch=100):
+    log(sql, args)
+    async with connection(read=True) as conn:
+        async with conn.cursor(aiomysql.SSDictCursor) as cur:
+            start = time.perf_counter()
+            await cur.execute(statement(sql), args or ())
+            observe_query(sql, time.perf_counter() - start)
+            while True:
+                rs = await cur.fetchmany(batch)
+                if not rs:
+                    break
+                yield rs
+
 #通用execute函数，update/save/remove使用
-@asyncio.coroutine
-def execute(sql, args):
+async def execute(sql, args):
     log(sql)
-    with (yield from __pool) as conn:
-        try:
-            cur = yield from conn.cursor()
-            yield from cur.execute(sql.replace('?','%s'), args)
+    async with connection() as conn:
+        async with conn.cursor() as cur:
+            start = time.perf_counter()
+            await cur.execute(statement(sql), args)
+            observe_query(sql, time.perf_counter() - start)
             affected = cur.rowcount
-            yield from cur.close()
-        except BaseException as e:
-            raise
         return affected
 
+#批量execute函数，saveMany/updateMany使用，整批语句在一个事务里提交(已在事务中时并入该事务)
+async def executemany(sql, seq_of_args):
+    log(sql)
+    async with transaction() as conn:
+        async with conn.cursor() as cur:
+            # 对insert ... values (...)语句，executemany会改写成一条多行insert，只需一次往返
+            start = time.perf_counter()
+            await cur.executemany(statement(sql), seq_of_args)
+            observe_query(sql, time.perf_counter() - start)
+            affected = cur.rowcount
+        return affected
+
+# 请求级别的identity map：(table, 主键) => Model实例
+# 由identity_map()在每个请求开始时创建(见app.py的identity_factory)，请求内重复按主键查询同一行时直接返回已加载的实例
+_identity = contextvars.ContextVar('identity_map', default=None)
+
+@contextlib.contextmanager
+def identity_map():
+    token = _identity.set({})
+    try:
+        yield
+    finally:
+        _identity.reset(token)
+
+# count()结果的缓存：table => LRUCache((where, args) => 行数)
+# 同一张表有写操作时整张表的缓存全部失效
+_COUNT_CACHE_SIZE = 256
+_counts = {}
+
+# 把序列按size切分成多段，批量操作时每段单独提交
+def chunks(seq, size):
+    seq = list(seq)
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
 # 这个函数主要是把查询字段计数并替换成sql识别的?占位符，后面通过传入参数来实现增、删、查、改
 # 比如说：insert into  `User` (`password`, `email`, `name`, `id`) values (?,?,?,?)  看到了么 后面这四个问号
 def create_args_string(num):
@@ -115,11 +350,23 @@ class ModelMetaclass(type):
                                 % (mappings.get(f).name or f),fields)),primarykey)
 
         attrs['__delete__'] = 'delete from `%s` where `%s`=?' % (tableName,primarykey)
+        attrs['__find__'] = '%s where `%s`=?' % (attrs['__select__'], primarykey)
+        # 声明了__cache__ = dict(ttl=60, maxsize=10000)的Model，find()先查进程内的LRU缓存
+        cache = attrs.get('__cache__', None)
+        attrs['__cache_store__'] = LRUCache(**cache) if cache else None
         return type.__new__(cls,name,bases,attrs)
 
 
 class Model(dict, metaclass = ModelMetaclass):
 
+    # saveMany/updateMany/removeMany每批处理的行数，子类可以覆盖
+    __batch_size__ = 500
+    # find()的读缓存配置，例如__cache__ = dict(ttl=60, maxsize=10000)，None表示不缓存
+    __cache__ = None
+    __cache_store__ = None
+    # count()结果缓存的秒数，0表示不缓存，子类可以覆盖，例如Blog的__count_ttl__ = 5
+    __count_ttl__ = 0
+
     def __init__(self, **kw):
         super(Model, self).__init__(**kw)
 
@@ -135,6 +382,13 @@ class Model(dict, metaclass = ModelMetaclass):
     def getValue(self, key):
         return getattr(self, key, None)
 
+    def attach(self):
+        ' put the instance into the current identity map, so find() in this request returns it. '
+        imap = _identity.get()
+        if imap is not None:
+            imap[(self.__table__, self.getValue(self.__primary_key__))] = self
+        return self
+
     def getValueOrDefault(self,key):
         #getattr是标准库内置函数
         value = getattr(self,key,None)
@@ -147,15 +401,20 @@ class Model(dict, metaclass = ModelMetaclass):
         return value
 
     @classmethod
-    async def findAll(cls, where=None, args=None, **kw):
-        ' find objects by where clause. '
+    def buildSelect(cls, where=None, args=None, **kw):
+        ' build select sql and args from where clause, orderBy and limit. '
         sql = [cls.__select__]
+        # 复制一份，避免limit参数追加到调用方传入的list里
+        args = list(args) if args else []
+        orderBy = kw.get('orderBy', None)
+        after = kw.get('after', None)
+        if after is not None:
+            # keyset分页：after是上一页最后一条记录的(排序字段值, 主键)，
+            # 用where跳过已经返回的记录，而不是limit offset扫描再丢弃前面所有的行
+            where, orderBy = cls._seek(where, args, orderBy, after)
         if where:
             sql.append('where')
             sql.append(where)
-        if args is None:
-            args = []
-        orderBy = kw.get('orderBy', None)
         if orderBy:
             sql.append('order by')
             sql.append(orderBy)
@@ -170,10 +429,57 @@ class Model(dict, metaclass = ModelMetaclass):
                 args.extend(limit)
             else:
                 raise ValueError('Invalid limit value: %s' % str(limit))
+        return ' '.join(sql), args
+
+    @classmethod
+    def _seek(cls, where, args, orderBy, after):
+        # orderBy只支持单个字段，例如'created_at desc'，主键作为第二排序字段保证顺序唯一，
+        # 第一页可以写成'created_at desc, id desc'，这样前后页的顺序完全一致
+        if not orderBy:
+            raise ValueError('orderBy is required when using after.')
+        terms = orderBy.split(',')
+        parts = terms[0].split()
+        if len(terms) > 2 or len(parts) > 2 or (len(parts) == 2 and parts[1].lower() not in ('asc', 'desc')) \
+                or (len(terms) == 2 and terms[1].split()[0].strip('`') != cls.__primary_key__):
+            raise ValueError('Invalid orderBy for keyset pagination: %s' % orderBy)
+        field = parts[0].strip('`')
+        direction = parts[1].lower() if len(parts) == 2 else 'asc'
+        op = '<' if direction == 'desc' else '>'
+        value, pk = after
+        seek = '(`%s` %s ? or (`%s` = ? and `%s` %s ?))' % (field, op, field, cls.__primary_key__, op)
+        where = '(%s) and %s' % (where, seek) if where else seek
+        args.extend([value, value, pk])
+        return where, '`%s` %s, `%s` %s' % (field, direction, cls.__primary_key__, direction)
+
+    @classmethod
+    async def findAll(cls, where=None, args=None, **kw):
+        ' find objects by where clause. '
+        sql, args = cls.buildSelect(where, args, **kw)
         # 返回的rs是一个元素是tuple的list
         # **r 是关键字参数，构成了一个cls类的列表，其实就是每一条记录对应的类实例
-        rs = await select(' '.join(sql), args)
-        return [cls(**r) for r in rs]
+        rs = await select(sql, args)
+        imap = _identity.get()
+        if imap is None:
+            return [cls(**r) for r in rs]
+        # 已经在本次请求中加载过的行，返回同一个实例
+        L = []
+        for r in rs:
+            key = (cls.__table__, r[cls.__primary_key__])
+            obj = imap.get(key)
+            if obj is None:
+                obj = imap[key] = cls(**r)
+            L.append(obj)
+        return L
+
+    @classmethod
+    async def iterAll(cls, where=None, args=None, batch=100, **kw):
+        ' iterate objects by where clause, fetching batch rows at a time. '
+        # 和findAll参数相同，但不会一次性把结果全部读进内存，适合导出整张表
+        # 用法：async for blog in Blog.iterAll(orderBy='created_at desc'): ...
+        sql, args = cls.buildSelect(where, args, **kw)
+        async for rs in select_iter(sql, args, batch):
+            for r in rs:
+                yield cls(**r)
 
     @classmethod
     async def findNumber(cls, selectField, where=None, args=None):
@@ -190,36 +496,166 @@ class Model(dict, metaclass = ModelMetaclass):
         # sql = ['select count(%s) _num_ from `%s`' % (selectField, cls.__table__)]
         return rs[0]['_num_']
 
+    @classmethod
+    async def count(cls, where=None, args=None, ttl=None):
+        ' count rows by where clause, optionally cached for ttl seconds. '
+        ttl = cls.__count_ttl__ if ttl is None else ttl
+        # 事务里可能有未提交的修改，不读也不写缓存
+        if ttl and _tx_conn.get() is None:
+            cache = _counts.get(cls.__table__)
+            if cache is None:
+                cache = _counts[cls.__table__] = LRUCache(_COUNT_CACHE_SIZE)
+            key = (where, tuple(args or ()))
+            num = cache.get(key)
+            if num is None:
+                num = await cls._count(where, args, replica=False)
+                cache.set(key, num, ttl)
+            return num
+        return await cls._count(where, args)
+
+    @classmethod
+    async def _count(cls, where, args, replica=True):
+        sql = ['select count(*) _num_ from `%s`' % cls.__table__]
+        if where:
+            sql.append('where')
+            sql.append(where)
+        rs = await select(' '.join(sql), args, 1, replica=replica)
+        return rs[0]['_num_']
+
+    @classmethod
+    def cacheStats(cls):
+        ' return hit/miss/eviction counters of the find() cache, or None if not enabled. '
+        store = cls.__cache_store__
+        return store.stats() if store is not None else None
+
+    @classmethod
+    def _changed(cls, saved=(), removed=()):
+        # 表中数据发生变化后调用：saved是写入的实例，removed是删除的主键
+        # 把变化同步到本次请求的identity map，并让count缓存和find()缓存失效(在事务中时等到提交之后)
+        pks = [obj.getValue(cls.__primary_key__) for obj in saved]
+        changes = _tx_changes.get()
+        if changes is None:
+            cls._invalidate(pks, removed)
+        else:
+            changes.append((cls, pks, list(removed)))
+        imap = _identity.get()
+        if imap is not None:
+            for pk, obj in zip(pks, saved):
+                imap[(cls.__table__, pk)] = obj
+            for pk in removed:
+                imap.pop((cls.__table__, pk), None)
 
+    @classmethod
+    def _invalidate(cls, saved, removed):
+        _counts.pop(cls.__table__, None)
+        store = cls.__cache_store__
+        if store is not None:
+            for pk in saved:
+                store.pop(pk)
+            for pk in removed:
+                store.pop(pk)
 
+    @classmethod
+    def _discard(cls, saved):
+        # 事务回滚：identity map中写入的实例没有提交，下次重新从数据库加载
+        imap = _identity.get()
+        if imap is not None:
+            for pk in saved:
+                imap.pop((cls.__table__, pk), None)
 
     @classmethod
     async def find(cls, pk):
-        #find object by primary key, 最后的1是返回的个数， rs是一个list，里面是一个dict
-        rs = await select('%s where `%s`=?' % (cls.__select__,cls.__primary_key__),[pk], 1)
-        if len(rs)==0:
-            return None
-        #rs是一个列表，rs中的每个元素是一个字典，每个字典就是所查询的表中的一个条目的所有信息。
-        return cls(**rs[0]) #返回一条记录，以dict的形式返回，因为cls的父类继承了dict类，** 是用来解包dict的
+        imap = _identity.get()
+        if imap is not None:
+            obj = imap.get((cls.__table__, pk))
+            if obj is not None:
+                return obj
+        store = cls.__cache_store__
+        # 事务里可能读到未提交的数据，不使用读缓存
+        if store is not None and _tx_conn.get() is not None:
+            store = None
+        row = store.get(pk) if store is not None else None
+        if row is None:
+            #find object by primary key, 最后的1是返回的个数， rs是一个list，里面是一个dict
+            # 要放进共享缓存的数据从主库读，复制延迟的副本可能还是提交前的旧数据
+            rs = await select(cls.__find__, [pk], 1, replica=store is None)
+            if len(rs)==0:
+                return None
+            #rs是一个列表，rs中的每个元素是一个字典，每个字典就是所查询的表中的一个条目的所有信息。
+            row = rs[0]
+            if store is not None:
+                store.set(pk, row)
+        # 每次都构造新的实例，调用方修改返回的对象不会影响缓存里的数据
+        obj = cls(**row) #返回一条记录，以dict的形式返回，因为cls的父类继承了dict类，** 是用来解包dict的
+        if imap is not None:
+            imap[(cls.__table__, pk)] = obj
+        return obj
 
     async def save(self):
         args = list(map(self.getValueOrDefault, self.__fields__))
         args.append(self.getValueOrDefault(self.__primary_key__))
         rows= await execute(self.__insert__,args)
+        self._changed(saved=[self])
         if rows != 1:
             logging.warning('failed to insert record: affected rows: %s' % rows)
     async def update(self):
         args = list(map(self.getValue, self.__fields__))
         args.append(self.getValue(self.__primary_key__))
         rows = await execute(self.__update__, args)
+        self._changed(saved=[self])
         if rows != 1:
             logging.warning('failed to update by primary key: affected rows: %s' % rows)
 
     async def remove(self):
         args = [self.getValue(self.__primary_key__)]
         rows = await execute(self.__delete__, args)
+        self._changed(removed=args)
         if rows != 1:
             logging.warning('failed to remove by primary key: affected rows: %s' % rows)
+
+    @classmethod
+    async def saveMany(cls, objs, size=None):
+        ' insert objects in batches, one transaction per batch. '
+        rows = total = 0
+        for chunk in chunks(objs, size or cls.__batch_size__):
+            args = []
+            for obj in chunk:
+                a = list(map(obj.getValueOrDefault, cls.__fields__))
+                a.append(obj.getValueOrDefault(cls.__primary_key__))
+                args.append(a)
+            rows += await executemany(cls.__insert__, args)
+            # objs可以是生成器，不能用len(objs)
+            total += len(chunk)
+            cls._changed(saved=chunk)
+        if rows != total:
+            logging.warning('failed to insert records: affected rows: %s of %s' % (rows, total))
+        return rows
+
+    @classmethod
+    async def updateMany(cls, objs, size=None):
+        ' update objects by primary key in batches, one transaction per batch. '
+        rows = 0
+        for chunk in chunks(objs, size or cls.__batch_size__):
+            args = []
+            for obj in chunk:
+                a = list(map(obj.getValue, cls.__fields__))
+                a.append(obj.getValue(cls.__primary_key__))
+                args.append(a)
+            rows += await executemany(cls.__update__, args)
+            cls._changed(saved=chunk)
+        return rows
+
+    @classmethod
+    async def removeMany(cls, pks, size=None):
+        ' delete rows by primary keys in batches. '
+        rows = 0
+        for chunk in chunks(pks, size or cls.__batch_size__):
+            # delete ... where pk in (?, ?, ...)，每批只需一条语句
+            sql = 'delete from `%s` where `%s` in (%s)' % (cls.__table__, cls.__primary_key__, create_args_string(len(chunk)))
+            rows += await execute(sql, chunk)
+            cls._changed(removed=chunk)
+        return rows
+
 #class Field 定义
 
 class Field(object):
@@ -254,11 +690,12 @@ class TextField(Field):
     def __init__(self, name=None, default=None):
         super().__init__(name,'text',False,default)
 
-@asyncio.coroutine
-def destroy_pool():
-    global __pool
-    if __pool is not None:
-        __pool.close()
-        yield from __pool.wait_closed()
+async def destroy_pool():
+    global __pool, __replicas
+    for pool in [__pool] + __replicas:
+        if pool is not None:
+            pool.close()
+            await pool.wait_closed()
+    __replicas = []
 
 
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+'''
+Stateless signed session tokens.
+
+A token is base64url(json claims) + '.' + base64url(HMAC-SHA256(claims)). The claims
+carry what templates and the /manage/ gate need (id, name, image, admin), so an
+authenticated request needs no users lookup.
+
+Keys come from configs.session: 'keys' maps key id => secret and 'current_key' is the
+id used to sign new tokens. Old keys stay in 'keys' until their tokens expire;
+removing a key invalidates every token signed with it. Without 'keys' the single
+configs.session.secret is used.
+
+Revocation (revoke_token, e.g. on sign out) is kept in memory and only applies to the
+current process.
+'''
+
+import base64, hashlib, hmac, json, time, uuid
+
+from config import configs
+from models import User
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+def _b64decode(s):
+    return base64.urlsafe_b64decode((s + '=' * (-len(s) % 4)).encode('ascii'))
+
+def _keys():
+    keys = configs.session.get('keys', None)
+    if keys:
+        return keys, configs.session.current_key
+    return {'0': configs.session.secret}, '0'
+
+def _digest(payload, secret):
+    return hmac.new(secret.encode('utf-8'), payload.encode('ascii'), hashlib.sha256).digest()
+
+def _sign(payload, secret):
+    return _b64encode(_digest(payload, secret))
+
+# 已注销的token：jti => exp。不能用会淘汰条目的LRU，否则被挤出去的token又会重新生效，
+# 所以用dict保存到token过期为止，定期清理已过期的条目。只在当前进程有效
+_revoked = {}
+_PRUNE_INTERVAL = 60
+_pruned_at = 0
+
+def _prune(now):
+    global _pruned_at
+    if now - _pruned_at < _PRUNE_INTERVAL:
+        return
+    _pruned_at = now
+    for jti, exp in list(_revoked.items()):
+        if exp < now:
+            del _revoked[jti]
+
+def user2token(user, max_age=86400):
+    ' build a signed token carrying the user claims. '
+    keys, kid = _keys()
+    claims = dict(kid=kid, jti=uuid.uuid4().hex, exp=int(time.time()) + max_age,
+                  id=user.id, name=user.name, image=user.image, admin=bool(user.admin))
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+    return '%s.%s' % (payload, _sign(payload, keys[kid]))
+
+def verify_token(token):
+    ' return the claims of a valid token, or None. '
+    try:
+        payload, sig = token.split('.')
+        claims = json.loads(_b64decode(payload).decode('utf-8'))
+        secret = _keys()[0].get(claims['kid'])
+        # 比较解码后的bytes：签名部分可能含有非ASCII字符，直接比较str时compare_digest会抛出TypeError
+        if secret is None or not hmac.compare_digest(_b64decode(sig), _digest(payload, secret)):
+            return None
+    except (ValueError, KeyError, TypeError):
+        return None
+    if claims['exp'] < time.time() or claims['jti'] in _revoked:
+        return None
+    return claims
+
+def token2user(token):
+    ' return a User built from the token claims without touching the database. '
+    claims = verify_token(token)
+    if claims is None:
+        return None
+    return User(id=claims['id'], name=claims['name'], image=claims['image'], admin=claims['admin'])
+
+def revoke_token(token):
+    ' revoke a token (e.g. on sign out) until it expires. '
+    claims = verify_token(token)
+    if claims is not None:
+        now = time.time()
+        _prune(now)
+        _revoked[claims['jti']] = claims['exp']
+
+def is_token(cookie_str):
+    # 旧格式的cookie是 id-expires-sha1，不含'.'
+    return '.' in cookie_str